@@ -1,4 +1,4 @@
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, WaiterError
 
 from .abstract import AbstractWrapper
 
@@ -6,6 +6,17 @@ from .abstract import AbstractWrapper
 class EC2Wrapper(AbstractWrapper):
     name = "ec2"
     endpoint_url = "https://api.cloud.croc.ru:443"
+    # errors after which it makes sense to retry launch in another subnet
+    capacity_error_codes = (
+        "InsufficientInstanceCapacity",
+        "InsufficientFreeAddressesInSubnet",
+        "InsufficientCapacity",
+        "Unsupported",
+    )
+
+    @classmethod
+    def is_capacity_error(cls, err: ClientError) -> bool:
+        return err.response["Error"]["Code"] in cls.capacity_error_codes
 
     def get_all_instances(self):
         return list(self.resource.instances.all())
@@ -75,7 +86,7 @@ class EC2Wrapper(AbstractWrapper):
                 err.response["Error"]["Message"],
             )
 
-    def run_instance_from_template(
+    def run_instances_from_template(
         self,
         *,
         idn: str | None = None,
@@ -106,6 +117,9 @@ class EC2Wrapper(AbstractWrapper):
             Default: 1
         :param max_count: The maximum number of instances to launch.
             Default: 1
+        :return: a tuple with two lists of launched instances: the first
+            with running instances, the second with instances that didn't
+            reach running state. Together at least min_count of them.
         """
         # check and prepare arguments
         if bool(idn) == bool(name):
@@ -122,7 +136,11 @@ class EC2Wrapper(AbstractWrapper):
         # create an instance
         try:
             self.log_info(
-                "Creation of instance from template %s...", idn or name
+                "Creation of %s-%s instances from template %s in %s...",
+                min_count,
+                max_count,
+                idn or name,
+                subnet,
             )
             instances = self.resource.create_instances(
                 LaunchTemplate=launch_template,
@@ -136,21 +154,37 @@ class EC2Wrapper(AbstractWrapper):
                 MinCount=min_count,
                 MaxCount=max_count,
             )
-            i = instances[0]
+            self.log_info("Launched %s instances", len(instances))
+            # instances boot in parallel, so waiting one by one is fine
+            running, not_running = [], []
+            for i in instances:
+                self.log_info(
+                    "Instance info: "
+                    "Id: %s, state: %s, private ip: %s, public ip: %s",
+                    i.id,
+                    i.state,
+                    i.private_ip_address,
+                    i.public_ip_address,
+                )
+                try:
+                    self.log_info("Waiting until %s exists", i.id)
+                    i.wait_until_exists()
+                    self.log_info("Waiting until %s running", i.id)
+                    i.wait_until_running()
+                    running.append(i)
+                except WaiterError as err:
+                    self.log_error(
+                        "Instance %s is not running. Here's why: %s",
+                        i.id,
+                        err,
+                    )
+                    not_running.append(i)
             self.log_info(
-                "Instance info: "
-                "Id: %s, state: %s, private ip: %s, public ip: %s",
-                i.id,
-                i.state,
-                i.private_ip_address,
-                i.public_ip_address,
+                "Instances created, %s running, %s not running",
+                len(running),
+                len(not_running),
             )
-            self.log_info("Waiting until exists")
-            i.wait_until_exists()
-            self.log_info("Waiting until running")
-            i.wait_until_running()
-            self.log_info("Instance created and run")
-            return i
+            return running, not_running
         # handle errors
         except ClientError as err:
             self.log_error(
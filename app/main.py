@@ -8,9 +8,12 @@ import time
 import urllib.error
 import urllib.request
 
+from botocore.exceptions import ClientError
+
 from .cloudwatch import CloudWatchWrapper
 from .ec2 import EC2Wrapper
 from .nginx import NginxConfig
+from .placement import ORDERED, SubnetPlacement
 
 logger = logging.getLogger("main")
 
@@ -31,11 +34,13 @@ class WatchDog:
         alarm_name_prefix: str = "cpu_bound_cpu_utilization_",
         check_period: int = 60,
         endpoint_timeout: int = 600,
+        subnet_strategy: str = ORDERED,
+        scale_out_step: int = 1,
     ):
         self.cw = cw
         self.ec2 = ec2
         self.nginx_config = nginx_config
-        self.subnet_id = subnet_id
+        self.placement = SubnetPlacement(subnet_id, subnet_strategy)
         self.node_limit = int(node_limit)
         self.watched_app_tag = watched_app_tag
         self.template_id = template_id
@@ -45,6 +50,11 @@ class WatchDog:
         self.alarm_name_prefix = alarm_name_prefix
         self.check_period = check_period
         self.endpoint_timeout = int(endpoint_timeout)
+        self.scale_out_step = int(scale_out_step)
+        if self.scale_out_step < 1:
+            raise ValueError(
+                f"scale_out_step must be positive, got {scale_out_step}"
+            )
 
     def create_alarm(self, instance_id):
         self.cw.create_cpu_utilization_alarm(
@@ -57,18 +67,102 @@ class WatchDog:
             name_prefix=self.alarm_name_prefix,
         )
 
-    def create_new_node(self):
-        logger.info("Creating new node")
-        instance = self.ec2.run_instance_from_template(
-            idn=self.template_id,
-            name=self.template_name,
-            version=self.template_version,
-            subnet=self.subnet_id,
-            tag_value=self.watched_app_tag,
-        )
-        self.create_alarm(instance.id)
-        logger.info(f"Node {instance.id} created")
-        return instance
+    def launch_in_subnet(self, subnet: str, count: int):
+        """
+        Launches up to count nodes in the subnet and records the result
+        in placement stats. Capacity errors are recorded and raised.
+        :return: a tuple with two lists: the first with running instances,
+            the second with instances that didn't reach running state.
+        """
+        start = time.time()
+        try:
+            running, not_running = self.ec2.run_instances_from_template(
+                idn=self.template_id,
+                name=self.template_name,
+                version=self.template_version,
+                subnet=subnet,
+                tag_value=self.watched_app_tag,
+                min_count=1,
+                max_count=count,
+            )
+        except ClientError as err:
+            # other errors are not a subnet problem, so keep its stats clean
+            if self.ec2.is_capacity_error(err):
+                self.placement.record_failure(subnet)
+            raise
+        if running:
+            # nodes boot in parallel, so it is the time of the whole batch
+            self.placement.record_success(subnet, time.time() - start)
+        else:
+            self.placement.record_failure(subnet)
+        return running, not_running
+
+    def launch_nodes(self, count: int):
+        """
+        Launches up to count nodes. Subnets are tried in order given by
+        placement and nodes are split between them by placement too.
+        If a subnet has no capacity for its part, the rest is requested
+        in the next subnet. Nodes still missing after that are requested
+        in subnets which took their part.
+        :param count: maximum number of nodes to launch.
+        :return: list of launched instances, at least one.
+        """
+        if count < 1:
+            raise ValueError(f"Nodes count must be positive, got {count}")
+        instances = []
+        last_err = None
+        subnets = self.placement.candidates()
+        shares = self.placement.split(count, subnets)
+        # the first pass follows the split, the second one gives
+        # missing nodes to subnets which still may have room
+        passes = list(zip(subnets, shares)) + [(s, 0) for s in subnets]
+        # subnets which can't take more nodes
+        full = set()
+        missing = 0
+        for subnet, share in passes:
+            wanted = share + missing
+            if wanted <= 0 or subnet in full:
+                continue
+            try:
+                running, not_running = self.launch_in_subnet(subnet, wanted)
+            except ClientError as err:
+                if not self.ec2.is_capacity_error(err):
+                    if instances:
+                        missing = wanted
+                        break
+                    raise
+                logger.warning(
+                    f"Subnet {subnet} has no capacity, try the next one"
+                )
+                last_err = err
+                full.add(subnet)
+                missing = wanted
+                continue
+            launched = running + not_running
+            instances.extend(launched)
+            missing = wanted - len(launched)
+            if missing or not running:
+                full.add(subnet)
+        if missing:
+            logger.warning(f"Failed to launch {missing} of {count} nodes")
+        if not instances:
+            # count is positive, so at least one subnet was tried
+            # and every try failed with capacity error
+            logger.error("There is no capacity in any subnet")
+            raise last_err
+        return instances
+
+    def create_new_node(self, count: int = 1):
+        """
+        :param count: maximum number of nodes to create.
+        :return: list of created instances.
+        """
+        logger.info(f"Creating {count} new nodes")
+        instances = self.launch_nodes(count)
+        for instance in instances:
+            self.create_alarm(instance.id)
+            logger.info(f"Node {instance.id} created")
+        return instances
 
     def start_node(self, idn):
         logger.info(f"Start node {idn}")
@@ -125,40 +219,51 @@ class WatchDog:
         self.refill_nginx_upstream(running)
         self.reload_nginx_config()
 
+    def wait_for_endpoint(self, instance, deadline: float) -> bool:
+        """
+        Waits until the application on the instance answers.
+        :param instance: instance to wait for
+        :param deadline: time.time() value after which we stop waiting
+        :return: True if the application answered.
+        """
+        host_port = self.get_instance_host_port(instance)
+        while time.time() < deadline:
+            try:
+                url = f"http://{host_port}/info"
+                logger.info(f"Wait for answer from {url}")
+                urllib.request.urlopen(url, timeout=10)
+                return True
+            except OSError as err:
+                logger.warning(f"An error occurs: {err}. But we still wait..")
+                time.sleep(10)
+        logger.error(
+            f"Endpoint {host_port} still unavailable after "
+            f"{self.endpoint_timeout} seconds"
+        )
+        return False
+
     def start_or_create(self, running, stopped):
         """
         If we have stopped node, we start one. Else, if we don't reach the
-        node limis, we run new node.
+        node limis, we run up to scale_out_step new nodes.
         :param running: list of the running instances
         :param stopped: list of the stopped instances
         """
-        instance = None
+        instances = []
         if stopped:
             instance = stopped[0]
             self.start_node(instance.id)
+            instances.append(instance)
         elif len(running) < self.node_limit:
-            instance = self.create_new_node()
-        if instance:
-            host_port = self.get_instance_host_port(instance)
-            start = time.time()
-            while time.time() - start < self.endpoint_timeout:
-                try:
-                    url = f"http://{host_port}/info"
-                    logger.info(f"Wait for answer from {url}")
-                    urllib.request.urlopen(url, timeout=10)
-                    self.update_nginx_upstream()
-                    break
-                except OSError as err:
-                    logger.warning(
-                        f"An error occurs: {err}. But we still wait.."
-                    )
-                    time.sleep(10)
-                    continue
-            else:
-                logger.error(
-                    f"Endpoint still unavailable after "
-                    f"{self.endpoint_timeout} seconds"
-                )
+            count = min(self.scale_out_step, self.node_limit - len(running))
+            instances = self.create_new_node(count)
+        # all nodes boot at the same time, so they share the deadline
+        deadline = time.time() + self.endpoint_timeout
+        available = [
+            i for i in instances if self.wait_for_endpoint(i, deadline)
+        ]
+        if available:
+            self.update_nginx_upstream()
 
     def stop_node(self, running):
         if running:
@@ -0,0 +1,180 @@
+import logging
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger("placement")
+
+ORDERED = "ordered"
+WEIGHTED = "weighted"
+FASTEST = "fastest"
+strategies = (ORDERED, WEIGHTED, FASTEST)
+
+
+class SubnetStats:
+    def __init__(self, window: float):
+        """
+        :param window: seconds for which launch results are kept.
+            Old results are forgotten, so a subnet that failed once
+            is tried again later.
+        """
+        self.window = window
+        # (time, latency) pairs, latency is None for failed launches
+        self.launches = deque()
+
+    def forget_old(self) -> None:
+        expired = time.time() - self.window
+        while self.launches and self.launches[0][0] < expired:
+            self.launches.popleft()
+
+    def add(self, latency: float | None) -> None:
+        self.launches.append((time.time(), latency))
+        self.forget_old()
+
+    @property
+    def attempts(self) -> int:
+        self.forget_old()
+        return len(self.launches)
+
+    @property
+    def latencies(self) -> list:
+        self.forget_old()
+        return [lt for _, lt in self.launches if lt is not None]
+
+    @property
+    def success_rate(self) -> float:
+        # a subnet we never tried is treated as a good one
+        if not self.attempts:
+            return 1.0
+        return len(self.latencies) / self.attempts
+
+    @property
+    def mean_latency(self) -> float:
+        latencies = self.latencies
+        if not latencies:
+            return 0.0
+        return sum(latencies) / len(latencies)
+
+    @property
+    def score(self) -> float:
+        """
+        Expected time to get a running node in the subnet,
+        the less the better.
+        """
+        success_rate = self.success_rate
+        if not success_rate:
+            return float("inf")
+        return self.mean_latency / success_rate
+
+    def __repr__(self):
+        return (
+            f"SubnetStats(attempts={self.attempts}, "
+            f"successes={len(self.latencies)}, "
+            f"mean_latency={self.mean_latency:.1f})"
+        )
+
+
+class SubnetPlacement:
+    def __init__(
+        self,
+        subnets: str,
+        strategy: str = ORDERED,
+        stats_window: float = 3600,
+    ):
+        """
+        :param subnets: comma separated list of subnets in order
+            of preference. Every subnet may have a weight after a colon,
+            e.g. "subnet-1:3, subnet-2:1". Default weight is 1.
+        :param strategy: how to order subnets for the next launch:
+            "ordered" - as listed in config,
+            "weighted" - random order according to weights,
+            so nodes are spread over subnets,
+            "fastest" - by expected launch time, i.e. mean launch latency
+            divided by launch success rate.
+        :param stats_window: seconds for which launch results are kept.
+        """
+        if strategy not in strategies:
+            raise ValueError(
+                f"Unknown subnet strategy {strategy}, "
+                f"expected one of: {', '.join(strategies)}"
+            )
+        self.strategy = strategy
+        self.weights = self.parse_subnets(subnets)
+        self.stats = {
+            subnet: SubnetStats(float(stats_window)) for subnet in self.weights
+        }
+
+    @staticmethod
+    def parse_subnets(subnets: str) -> dict:
+        weights = {}
+        for item in subnets.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            subnet, _, weight = item.partition(":")
+            subnet = subnet.strip()
+            if subnet in weights:
+                raise ValueError(
+                    f"Subnet {subnet} is listed twice in subnet_id"
+                )
+            try:
+                weight = float(weight) if weight.strip() else 1.0
+            except ValueError:
+                raise ValueError(
+                    f"Weight of subnet_id entry {item} is not a number"
+                ) from None
+            if weight <= 0:
+                raise ValueError(
+                    f"Weight of subnet_id entry {item} must be positive"
+                )
+            weights[subnet] = weight
+        if not weights:
+            raise ValueError("At least one subnet must be specified")
+        return weights
+
+    def candidates(self) -> list:
+        """
+        :return: list of subnets in order they should be tried.
+        """
+        subnets = list(self.weights)
+        if self.strategy == WEIGHTED:
+            # weighted shuffle: the bigger weight, the closer to the head
+            subnets.sort(
+                key=lambda s: random.random() ** (1 / self.weights[s]),
+                reverse=True,
+            )
+        elif self.strategy == FASTEST:
+            subnets.sort(key=lambda s: self.stats[s].score)
+        return subnets
+
+    def split(self, count: int, subnets: list) -> list:
+        """
+        Splits nodes between subnets. With "weighted" strategy nodes are
+        spread according to weights, others put all nodes into the first
+        subnet and use the rest only as fallback.
+        :param count: number of nodes to launch.
+        :param subnets: subnets as returned by candidates().
+        :return: list of node counts, one per subnet.
+        """
+        if self.strategy != WEIGHTED:
+            return [count] + [0] * (len(subnets) - 1)
+        total = sum(self.weights[s] for s in subnets)
+        shares = [int(count * self.weights[s] / total) for s in subnets]
+        # the rest goes one by one in candidates order,
+        # so single node launches are still spread by weights
+        for i in range(count - sum(shares)):
+            shares[i] += 1
+        return shares
+
+    def record_success(self, subnet: str, latency: float) -> None:
+        """
+        :param latency: seconds from launch request till nodes are running.
+        """
+        stats = self.stats[subnet]
+        stats.add(latency)
+        logger.info(f"Subnet {subnet} launch succeeded: {stats}")
+
+    def record_failure(self, subnet: str) -> None:
+        stats = self.stats[subnet]
+        stats.add(None)
+        logger.info(f"Subnet {subnet} launch failed: {stats}")